@@ -1,12 +1,10 @@
 import streamlit as st
-import pandas as pd
 import os
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
-import matplotlib.pyplot as plt
-import shutil
-import calendar
+import json
+import tempfile
+import threading
+import time
+import uuid
 import warnings
 
 # Suprimir warnings específicos de parsing de datas
@@ -14,8 +12,16 @@ warnings.filterwarnings('ignore', message='.*Parsing dates in.*')
 warnings.filterwarnings('ignore', category=UserWarning, module='pandas')
 warnings.filterwarnings('ignore', message='.*dayfirst.*')
 
-# Configurar pandas para não fazer parsing automático de datas
-pd.options.mode.chained_assignment = None
+# pandas e plotly são importados só no ponto de uso (dentro das funções e das
+# seções que precisam deles), para acelerar a inicialização com o armazenamento vazio
+def importar_pandas():
+    """
+    Importa o pandas já com as opções usadas pelas seções do dashboard
+    """
+    import pandas as pd
+    # Configurar pandas para não fazer parsing automático de datas
+    pd.options.mode.chained_assignment = None
+    return pd
 
 # Função para mapear categorias de terminal
 def mapear_categoria_terminal(categoria):
@@ -31,6 +37,7 @@ def parse_dates_safely(date_series):
     """
     Converte série de datas de forma segura, tentando múltiplos formatos
     """
+    import pandas as pd
     try:
         # Primeiro tenta com dayfirst=True
         return pd.to_datetime(date_series, errors='coerce', dayfirst=True)
@@ -49,8 +56,25 @@ def parse_dates_safely(date_series):
 # Diretórios
 UPLOAD_DIR = "uploads"
 PROCESSED_DIR = "processed"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DIR, exist_ok=True)
+EXPORT_DIR = "exports"
+COMPACTED_DIR = "compacted"  # Meses antigos resumidos por dia/PDV/SERIAL
+ARCHIVE_DIR = "archive"      # Detalhe bruto dos meses compactados (armazenamento frio)
+CACHE_DIR = "cache"          # Agregados reaproveitados entre reinícios do servidor
+# Índice dos meses disponíveis, lido na inicialização no lugar de listar os diretórios.
+# Os diretórios são criados apenas quando algo é gravado neles.
+MANIFEST_PATH = os.path.join(PROCESSED_DIR, "manifest.json")
+TOTAIS_PDV_PATH = os.path.join(CACHE_DIR, "totais_pdv.parquet")
+
+# Política de retenção: quantos meses mais recentes mantêm o detalhe completo.
+# Meses anteriores são compactados; o detalhe vai para ARCHIVE_DIR se ARQUIVAR_DETALHE
+# estiver ativo, ou é descartado caso contrário.
+MESES_DETALHE_COMPLETO = int(os.environ.get('DASHBOARD_MESES_DETALHE', 12))
+ARQUIVAR_DETALHE = os.environ.get('DASHBOARD_ARQUIVAR_DETALHE', '1') == '1'
+
+# Quantidade de linhas lidas por vez ao gerar exportações
+TAMANHO_LOTE_EXPORTACAO = 50_000
+# Exportações mais antigas que isso (em segundos) são apagadas de EXPORT_DIR
+VALIDADE_EXPORTACAO = 60 * 60
 
 # Configuração da página
 st.set_page_config(
@@ -97,6 +121,7 @@ def validar_nome_arquivo(nome_arquivo):
 
 @st.cache_data
 def processar_csv(arquivo, mes_nome=None):
+    import pandas as pd
     try:
         encodings = ['utf-8', 'latin1', 'iso-8859-1']
         for encoding in encodings:
@@ -159,10 +184,389 @@ def processar_csv(arquivo, mes_nome=None):
         return None
 
 def salvar_processado(df, nome_base):
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
     df.to_parquet(os.path.join(PROCESSED_DIR, nome_base + '.parquet'))
+    # Um novo upload substitui a versão compactada do mesmo mês
+    caminho_compactado = os.path.join(COMPACTED_DIR, nome_base + '.parquet')
+    if os.path.exists(caminho_compactado):
+        os.remove(caminho_compactado)
+    atualizar_manifesto(nome_base + '.parquet', 'detalhado', resumo_para_manifesto(df))
+
+def caminho_processado(arquivo):
+    """
+    Retorna o caminho do arquivo do mês no nível em que ele estiver
+    (detalhe completo em PROCESSED_DIR ou resumo em COMPACTED_DIR)
+    """
+    for diretorio in (PROCESSED_DIR, COMPACTED_DIR):
+        caminho = os.path.join(diretorio, arquivo)
+        if os.path.exists(caminho):
+            return caminho
+    return os.path.join(PROCESSED_DIR, arquivo)
+
+def caminho_transacoes(arquivo):
+    """
+    Retorna o caminho das transações do mês: o detalhe completo em PROCESSED_DIR ou,
+    para meses compactados, o detalhe guardado em ARCHIVE_DIR. None se o detalhe foi descartado
+    """
+    for diretorio in (PROCESSED_DIR, ARCHIVE_DIR):
+        caminho = os.path.join(diretorio, arquivo)
+        if os.path.exists(caminho):
+            return caminho
+    return None
+
+def meses_sem_detalhe(arquivos):
+    """
+    Meses compactados cujo detalhe foi descartado (ARQUIVAR_DETALHE desligado): deles
+    só resta o resumo diário, que não pode ser exportado como transações
+    """
+    return [nome_base_para_mes(arquivo.replace('.parquet', '')) for arquivo in arquivos if caminho_transacoes(arquivo) is None]
+
+# Poucas entradas: os gráficos só leem o mês selecionado e o anterior
+@st.cache_data(max_entries=12)
+def ler_parquet(caminho, modificado_em):
+    """
+    Leitura de um parquet em cache; `modificado_em` renova o cache quando o arquivo muda
+    """
+    import pandas as pd
+    return pd.read_parquet(caminho)
 
 def carregar_processado(nome_base):
-    return pd.read_parquet(os.path.join(PROCESSED_DIR, nome_base + '.parquet'))
+    caminho = caminho_processado(nome_base + '.parquet')
+    if not os.path.exists(caminho):
+        return None
+    return ler_parquet(caminho, os.path.getmtime(caminho))
+
+def colunas_existentes(caminho, colunas):
+    import pyarrow.parquet as pq
+    nomes = pq.read_schema(caminho).names
+    return [c for c in colunas if c in nomes]
+
+def resumo_para_manifesto(df):
+    """
+    Totais por tipo de pagamento e tipos de pagamento de cada equipamento de um mês.
+    Ficam no manifesto para o gráfico de evolução e os filtros não lerem os parquets
+    """
+    totais = {}
+    tipos_por_equipamento = {}
+    if 'T.PGTO' in df.columns and 'VALOR' in df.columns:
+        totais = {str(tipo): float(valor) for tipo, valor in df.groupby('T.PGTO')['VALOR'].sum().items()}
+    if 'EQUIPAMENTO' in df.columns and 'T.PGTO' in df.columns:
+        pares = df[['EQUIPAMENTO', 'T.PGTO']].dropna().drop_duplicates()
+        for equipamento, tipos in pares.groupby('EQUIPAMENTO')['T.PGTO']:
+            tipos_por_equipamento[str(equipamento)] = sorted(str(t) for t in tipos)
+    return {'totais': totais, 'tipos_por_equipamento': tipos_por_equipamento}
+
+def resumo_do_arquivo(caminho):
+    import pandas as pd
+    return resumo_para_manifesto(pd.read_parquet(caminho, columns=colunas_existentes(caminho, ['EQUIPAMENTO', 'T.PGTO', 'VALOR'])))
+
+@st.cache_data(max_entries=4)
+def totais_por_pdv(assinatura):
+    """
+    Vendas de todos os meses somadas por PDV, equipamento e tipo de pagamento (Top 10).
+    `assinatura` traz (caminho, data de modificação) de cada mês, então o cache se
+    renova quando algum arquivo muda. Retorna None se nenhum mês puder ser lido
+    """
+    import pandas as pd
+    # Um processo novo (reinício do servidor) reaproveita o resultado gravado em disco
+    # enquanto a assinatura dos meses for a mesma, sem abrir todos os meses de novo
+    chave = json.dumps(assinatura).encode()
+    salvo = ler_totais_pdv(chave)
+    if salvo is not None:
+        return salvo
+    partes = []
+    for caminho, _ in assinatura:
+        # Só as colunas necessárias, e não o arquivo inteiro
+        colunas = colunas_existentes(caminho, ['PDV', 'EQUIPAMENTO', 'T.PGTO', 'VALOR'])
+        if 'VALOR' in colunas and len(colunas) > 1:
+            df = pd.read_parquet(caminho, columns=colunas)
+            partes.append(df.groupby(colunas[:-1], dropna=False)['VALOR'].sum().reset_index())
+    if not partes:
+        return None
+    df = pd.concat(partes, ignore_index=True)
+    chaves = [c for c in ['PDV', 'EQUIPAMENTO', 'T.PGTO'] if c in df.columns]
+    df = df.groupby(chaves, dropna=False)['VALOR'].sum().reset_index()
+    salvar_totais_pdv(df, chave)
+    return df
+
+def ler_totais_pdv(chave):
+    import pyarrow.parquet as pq
+    if not os.path.exists(TOTAIS_PDV_PATH):
+        return None
+    # A assinatura dos meses fica nos metadados do próprio parquet
+    tabela = pq.read_table(TOTAIS_PDV_PATH)
+    if (tabela.schema.metadata or {}).get(b'assinatura') != chave:
+        return None
+    return tabela.to_pandas()
+
+def salvar_totais_pdv(df, chave):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    tabela = tabela.replace_schema_metadata({**tabela.schema.metadata, b'assinatura': chave})
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix='.tmp', delete=False) as f:
+        pq.write_table(tabela, f)
+    os.replace(f.name, TOTAIS_PDV_PATH)
+
+def assinatura_meses(arquivos):
+    caminhos = [caminho_processado(arquivo) for arquivo in arquivos]
+    return tuple((caminho, os.path.getmtime(caminho)) for caminho in caminhos if os.path.exists(caminho))
+
+def nome_base_para_mes(nome_base):
+    # Exemplo: 'marco_25' -> 'Marco 2025'
+    mes, ano = nome_base.split('_')
+    return f"{mes.capitalize()} 20{ano}"
+
+def escanear_meses():
+    """
+    Monta o manifesto listando os diretórios de dados (nível de cada mês incluído)
+    """
+    manifesto = {}
+    # Meses compactados primeiro, para o detalhe completo prevalecer quando existirem os dois
+    for diretorio, nivel in ((COMPACTED_DIR, 'compactado'), (PROCESSED_DIR, 'detalhado')):
+        if not os.path.isdir(diretorio):
+            continue
+        for arquivo in os.listdir(diretorio):
+            if arquivo.endswith('.parquet'):
+                try:
+                    mes = nome_base_para_mes(arquivo.replace('.parquet', ''))
+                except ValueError:
+                    continue
+                manifesto[mes] = {'arquivo': arquivo, 'nivel': nivel, **resumo_do_arquivo(os.path.join(diretorio, arquivo))}
+    return manifesto
+
+@st.cache_resource
+def trava_manifesto():
+    """
+    Trava única no processo para as atualizações do manifesto. As sessões do Streamlit
+    são threads do mesmo processo e o script roda de novo a cada rerun, por isso a trava
+    fica no cache_resource e não numa variável do módulo. É reentrante porque a
+    retenção segura a trava enquanto compacta e atualiza o manifesto
+    """
+    return threading.RLock()
+
+def salvar_manifesto(manifesto):
+    os.makedirs(PROCESSED_DIR, exist_ok=True)
+    # Arquivo temporário exclusivo, para gravações simultâneas não disputarem o mesmo nome
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=PROCESSED_DIR, suffix='.tmp', delete=False) as f:
+        json.dump(manifesto, f, ensure_ascii=False, indent=2)
+    os.replace(f.name, MANIFEST_PATH)
+
+def carregar_manifesto():
+    """
+    Lê o manifesto de meses; se ele não existir (ou estiver corrompido), reconstrói
+    a partir dos diretórios uma única vez
+    """
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        with trava_manifesto():
+            manifesto = escanear_meses()
+            if manifesto:
+                salvar_manifesto(manifesto)
+        return manifesto
+
+def atualizar_manifesto(arquivo, nivel=None, resumo=None):
+    # nivel=None remove o mês do manifesto
+    mes = nome_base_para_mes(arquivo.replace('.parquet', ''))
+    # Ler, alterar e gravar sob a trava, para uma sessão não apagar a alteração de outra
+    with trava_manifesto():
+        manifesto = carregar_manifesto()
+        if nivel is None:
+            manifesto.pop(mes, None)
+        else:
+            manifesto[mes] = {'arquivo': arquivo, 'nivel': nivel, **(resumo or {})}
+        salvar_manifesto(manifesto)
+
+def resumir_mes(df):
+    """
+    Agrupa as transações de um mês por dia, PDV, SERIAL, equipamento e tipo de pagamento.
+    A data fica em DATA/HORA no formato dd/mm/aaaa, então os gráficos leem o resumo
+    do mesmo jeito que leem o detalhe
+    """
+    df = df.copy()
+    if 'DATA/HORA' in df.columns:
+        df['DATA/HORA'] = parse_dates_safely(df['DATA/HORA']).dt.strftime('%d/%m/%Y')
+    chaves = [c for c in ['DATA/HORA', 'PDV', 'SERIAL', 'EQUIPAMENTO', 'T.PGTO', 'Mês'] if c in df.columns]
+    return df.groupby(chaves, dropna=False).agg(
+        VALOR=('VALOR', 'sum'),
+        QTD=('VALOR', 'size')
+    ).reset_index()
+
+def compactar_mes(arquivo):
+    """
+    Substitui o detalhe completo de um mês pelo seu resumo diário
+    """
+    import pandas as pd
+    caminho_detalhe = os.path.join(PROCESSED_DIR, arquivo)
+    caminho_compactado = os.path.join(COMPACTED_DIR, arquivo)
+    # Grava em arquivo temporário para não deixar um resumo incompleto em caso de erro
+    caminho_temp = caminho_compactado + '.tmp'
+    os.makedirs(COMPACTED_DIR, exist_ok=True)
+    resumo = resumir_mes(pd.read_parquet(caminho_detalhe))
+    resumo.to_parquet(caminho_temp, index=False)
+    os.replace(caminho_temp, caminho_compactado)
+    if ARQUIVAR_DETALHE:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        os.replace(caminho_detalhe, os.path.join(ARCHIVE_DIR, arquivo))
+    else:
+        os.remove(caminho_detalhe)
+    atualizar_manifesto(arquivo, 'compactado', resumo_para_manifesto(resumo))
+
+def aplicar_retencao():
+    """
+    Compacta os meses com detalhe completo que ficaram fora dos MESES_DETALHE_COMPLETO
+    mais recentes do histórico. Retorna a lista de meses compactados
+    """
+    # Sob a trava, para dois uploads simultâneos não compactarem o mesmo mês
+    with trava_manifesto():
+        manifesto = carregar_manifesto()
+        recentes = sorted(manifesto, key=mes_ano_para_ordem)[-MESES_DETALHE_COMPLETO:] if MESES_DETALHE_COMPLETO > 0 else []
+        compactados = []
+        for mes, info in manifesto.items():
+            if mes not in recentes and info['nivel'] == 'detalhado' and os.path.exists(os.path.join(PROCESSED_DIR, info['arquivo'])):
+                compactar_mes(info['arquivo'])
+                compactados.append(mes)
+    return compactados
+
+# Função para aplicar os filtros gerais (categoria e tipo de pagamento)
+def aplicar_filtros(df, categoria, tipo_pag):
+    if categoria != 'TODOS':
+        df = df[df['EQUIPAMENTO'] == categoria]
+    if tipo_pag != 'TODOS':
+        df = df[df['T.PGTO'] == tipo_pag]
+    return df
+
+def esquema_exportacao(arquivos):
+    """
+    Monta um esquema único (colunas e tipos) para todos os meses exportados, na ordem
+    em que as colunas aparecem. Quando um mesmo campo tem tipos diferentes entre os
+    meses, usa float64 se ambos forem numéricos e texto caso contrário
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    tipos = {}
+    for arquivo in arquivos:
+        caminho = caminho_transacoes(arquivo)
+        if caminho is None:
+            continue
+        for campo in pq.read_schema(caminho):
+            # Ignorar a coluna de índice gravada pelo pandas
+            if campo.name.startswith('__index_level_'):
+                continue
+            atual = tipos.get(campo.name)
+            if atual is None or pa.types.is_null(atual):
+                tipos[campo.name] = campo.type
+            elif not pa.types.is_null(campo.type) and atual != campo.type:
+                numericos = all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (atual, campo.type))
+                tipos[campo.name] = pa.float64() if numericos else pa.string()
+    # Colunas sempre vazias são exportadas como texto
+    return pa.schema([pa.field(nome, pa.string() if pa.types.is_null(tipo) else tipo) for nome, tipo in tipos.items()])
+
+def iterar_lotes_filtrados(arquivos, categoria, tipo_pag, esquema, tamanho_lote=TAMANHO_LOTE_EXPORTACAO):
+    """
+    Lê as transações de cada mês em lotes e devolve cada lote já filtrado e com as
+    colunas do esquema, sem montar um DataFrame com todos os dados em memória.
+    Meses compactados são lidos do detalhe arquivado, nunca do resumo diário
+    """
+    import pyarrow.parquet as pq
+    for arquivo in arquivos:
+        caminho = caminho_transacoes(arquivo)
+        if caminho is None:
+            continue
+        parquet = pq.ParquetFile(caminho)
+        colunas = [c for c in parquet.schema_arrow.names if c in esquema.names]
+        for lote in parquet.iter_batches(batch_size=tamanho_lote, columns=colunas):
+            df_lote = aplicar_filtros(lote.to_pandas(), categoria, tipo_pag)
+            if not df_lote.empty:
+                # Meses com colunas diferentes (ou em outra ordem) ficam alinhados
+                yield df_lote.reindex(columns=esquema.names)
+
+def gerar_csv_ptbr(lotes):
+    """
+    Converte os lotes em trechos de CSV no formato brasileiro (';' e vírgula decimal)
+    """
+    primeiro = True
+    for df_lote in lotes:
+        yield df_lote.to_csv(sep=';', decimal=',', index=False, header=primeiro)
+        primeiro = False
+
+def escrever_exportacao(lotes, formato, caminho_destino, esquema):
+    """
+    Grava os lotes no arquivo de destino (CSV ou Parquet) e retorna o total de linhas
+    """
+    total_linhas = 0
+    if formato == 'CSV':
+        def contar(lotes):
+            nonlocal total_linhas
+            for df_lote in lotes:
+                total_linhas += len(df_lote)
+                yield df_lote
+        # utf-8-sig para o Excel reconhecer a acentuação
+        with open(caminho_destino, 'w', encoding='utf-8-sig', newline='') as f:
+            for trecho in gerar_csv_ptbr(contar(lotes)):
+                f.write(trecho)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        colunas_texto = [campo.name for campo in esquema if pa.types.is_string(campo.type)]
+        with pq.ParquetWriter(caminho_destino, esquema) as writer:
+            for df_lote in lotes:
+                # Colunas de texto em um mês podem vir numéricas (ou vazias) em outro
+                for coluna in colunas_texto:
+                    df_lote[coluna] = df_lote[coluna].astype('string')
+                writer.write_table(pa.Table.from_pandas(df_lote, schema=esquema, preserve_index=False))
+                total_linhas += len(df_lote)
+    return total_linhas
+
+def novo_caminho_exportacao(extensao):
+    """
+    Caminho exclusivo para cada exportação, para que sessões com os mesmos filtros
+    não sobrescrevam o arquivo uma da outra
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    return os.path.join(EXPORT_DIR, uuid.uuid4().hex + extensao)
+
+def limpar_exportacoes(validade=VALIDADE_EXPORTACAO):
+    """
+    Apaga de EXPORT_DIR as exportações geradas há mais de `validade` segundos
+    """
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    limite = time.time() - validade
+    for arquivo in os.listdir(EXPORT_DIR):
+        caminho = os.path.join(EXPORT_DIR, arquivo)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            # Já removido por outra sessão
+            continue
+
+def descartar_exportacao(exportacao):
+    try:
+        os.remove(exportacao['caminho'])
+    except OSError:
+        pass
+
+def leitor_exportacao(caminho):
+    """
+    Função passada ao st.download_button: o arquivo só é aberto quando o usuário clica
+    em baixar, e não a cada rerun da página. Devolve o arquivo aberto, e não uma cópia
+    dos bytes; o Streamlit lê o conteúdo para o seu armazenamento de mídia
+    """
+    def abrir():
+        return open(caminho, 'rb')
+    return abrir
+
+def df_para_csv_ptbr(df):
+    return df.to_csv(sep=';', decimal=',', index=False).encode('utf-8-sig')
+
+def nome_exportacao(*partes):
+    nome = '_'.join(str(p) for p in partes)
+    return ''.join(c if c.isalnum() else '_' for c in nome.lower())
 
 # Interface principal
 st.title("📊 Dashboard de Vendas")
@@ -170,53 +574,62 @@ st.title("📊 Dashboard de Vendas")
 # Seção de upload de arquivo
 st.subheader("Upload de Novo Arquivo")
 arquivo_upload = st.file_uploader("Selecione um arquivo CSV", type=['csv'])
-if arquivo_upload is not None:
+# O file_uploader devolve o mesmo arquivo em todos os reruns: cada upload é processado
+# uma única vez, e não a cada interação com a página
+if arquivo_upload is not None and arquivo_upload.file_id != st.session_state.get('upload_processado'):
+    st.session_state['upload_processado'] = arquivo_upload.file_id
     if validar_nome_arquivo(arquivo_upload.name):
+        pd = importar_pandas()
         nome_base = arquivo_upload.name.replace('.csv', '')
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
         caminho_csv = os.path.join(UPLOAD_DIR, arquivo_upload.name)
         with open(caminho_csv, 'wb') as f:
             f.write(arquivo_upload.getvalue())
         with st.spinner("Processando arquivo..."):
-            mes, ano = nome_base.split('_')
-            mes_nome = f"{mes.capitalize()} 20{ano}"
+            mes_nome = nome_base_para_mes(nome_base)
             df_proc = processar_csv(caminho_csv, mes_nome=mes_nome)
             if df_proc is not None:
                 salvar_processado(df_proc, nome_base)
                 st.success("Arquivo processado e salvo!")
+                compactados = aplicar_retencao()
+                if compactados:
+                    st.info(f"Meses compactados pela política de retenção: {', '.join(compactados)}")
             else:
                 st.error("Erro ao processar o arquivo.")
         st.cache_data.clear()
     else:
         st.error("O nome do arquivo deve seguir o padrão 'mês_ano.csv' (ex: janeiro_25.csv)")
 
-# Mapear meses para arquivos processados
-meses_arquivos = {}
-for arquivo in os.listdir(PROCESSED_DIR):
-    if arquivo.endswith('.parquet'):
-        nome_sem_extensao = arquivo.replace('.parquet', '')
-        try:
-            mes, ano = nome_sem_extensao.split('_')
-            mes_nome = mes.capitalize()
-            meses_arquivos[f"{mes_nome} 20{ano}"] = arquivo
-        except:
-            continue
+# Mapear meses para arquivos processados a partir do manifesto
+manifesto = carregar_manifesto()
+meses_arquivos = {mes: info['arquivo'] for mes, info in manifesto.items()}
 
 # Obter meses disponíveis e ordenar
 meses_disponiveis = sorted(list(meses_arquivos.keys()), key=mes_ano_para_ordem)
 
 # Mostrar mensagens de status de carregamento
 with st.expander("Status de carregamento dos arquivos"):
+    # Útil quando arquivos forem adicionados ou removidos fora do dashboard
+    if st.button("Reconstruir lista de arquivos", key="reconstruir_manifesto"):
+        with trava_manifesto():
+            salvar_manifesto(escanear_meses())
+        st.cache_data.clear()
+        st.rerun()
     for mes, arquivo in meses_arquivos.items():
         col1, col2 = st.columns([3, 1])
         with col1:
-            if os.path.exists(os.path.join(PROCESSED_DIR, arquivo)):
-                st.success(f"{mes}: Arquivo processado encontrado")
-            else:
+            if not os.path.exists(caminho_processado(arquivo)):
                 st.error(f"{mes}: Arquivo não encontrado")
+            elif manifesto[mes]['nivel'] == 'compactado':
+                st.info(f"{mes}: Resumo diário por PDV/SERIAL (mês compactado)")
+            else:
+                st.success(f"{mes}: Arquivo processado encontrado")
         with col2:
             if st.button(f"Excluir {mes}", key=f"excluir_{mes}"):
                 try:
-                    os.remove(os.path.join(PROCESSED_DIR, arquivo))
+                    if os.path.exists(caminho_processado(arquivo)):
+                        os.remove(caminho_processado(arquivo))
+                    atualizar_manifesto(arquivo)
                     st.success(f"Arquivo {mes} excluído com sucesso!")
                     st.cache_data.clear()
                     st.rerun()
@@ -225,21 +638,24 @@ with st.expander("Status de carregamento dos arquivos"):
 
 # Widget de seleção de mês
 if meses_disponiveis:
+    pd = importar_pandas()
+    import plotly.express as px
+
     # Gráficos de evolução (primeiro, antes dos filtros)
     st.subheader("Evolução de Vendas por Tipo de Pagamento")
     
-    # Preparar dados para série temporal
+    # Tabelas agregadas por trás de cada gráfico (usadas na exportação)
+    tabelas_graficos = {}
+
+    # Preparar dados para série temporal (totais guardados no manifesto)
     dados_serie = []
-    for mes, arquivo in meses_arquivos.items():
-        df_temp = carregar_processado(arquivo.replace('.parquet', ''))
-        if df_temp is not None:
-            df_temp = df_temp[df_temp['T.PGTO'].isin(['LISTA', 'PIX'])]
-            agrupado = df_temp.groupby('T.PGTO')['VALOR'].sum().reset_index()
-            for _, row in agrupado.iterrows():
+    for mes in meses_arquivos:
+        for tipo_pag, valor in manifesto[mes].get('totais', {}).items():
+            if tipo_pag in ['LISTA', 'PIX']:
                 dados_serie.append({
                     'Mês': mes,
-                    'T.PGTO': row['T.PGTO'],
-                    'VALOR': row['VALOR']
+                    'T.PGTO': tipo_pag,
+                    'VALOR': valor
                 })
     
     if dados_serie:
@@ -249,6 +665,7 @@ if meses_disponiveis:
         ordem_meses = {mes: i for i, mes in enumerate(meses_disponiveis)}
         df_serie['ordem'] = df_serie['Mês'].map(ordem_meses)
         df_serie = df_serie.sort_values('ordem')
+        tabelas_graficos['Evolução mensal (LISTA/PIX)'] = df_serie[['Mês', 'T.PGTO', 'VALOR']]
         
         # Gráfico de barras para LISTA e PIX
         df_lista = df_serie[df_serie['T.PGTO'] == 'LISTA'].copy()
@@ -310,16 +727,19 @@ if meses_disponiveis:
     # --- FILTROS GERAIS ---
     st.subheader("Filtros Gerais")
     
-    # Juntar todos os dados processados para obter as opções de filtro
-    all_dfs = []
-    for arquivo in meses_arquivos.values():
-        df_temp = carregar_processado(arquivo.replace('.parquet', ''))
-        if df_temp is not None:
-            all_dfs.append(df_temp)
-    
-    if all_dfs:
-        df_all = pd.concat(all_dfs, ignore_index=True)
-        
+    # Opções de filtro a partir do manifesto, sem ler os dados de todos os meses
+    tipos_por_equipamento = {}
+    for info in manifesto.values():
+        for equipamento, tipos in info.get('tipos_por_equipamento', {}).items():
+            tipos_por_equipamento.setdefault(equipamento, set()).update(tipos)
+    tipos_pagamento_todos = set()
+    for info in manifesto.values():
+        tipos_pagamento_todos.update(info.get('totais', {}))
+
+    # Vendas de todos os meses por PDV (Top 10), em cache entre os reruns
+    df_totais_pdv = totais_por_pdv(assinatura_meses(meses_arquivos.values()))
+
+    if df_totais_pdv is not None:
         # Layout dos filtros em colunas
         col_filtro1, col_filtro2, col_filtro3 = st.columns(3)
         
@@ -328,13 +748,13 @@ if meses_disponiveis:
         
         with col_filtro2:
             # Filtro de categoria (agora usando EQUIPAMENTO)
-            categorias = ['TODOS'] + sorted(df_all['EQUIPAMENTO'].dropna().unique().tolist())
+            categorias = ['TODOS'] + sorted(tipos_por_equipamento)
             categoria_escolhida = st.selectbox("Categoria de Terminal", categorias, key="filtro_categoria")
         
         with col_filtro3:
             # Filtro de tipo de pagamento (dinâmico baseado na categoria) (agora usando T.PGTO)
             if categoria_escolhida == 'TODOS':
-                tipos_pagamento_disponiveis = ['TODOS'] + sorted(df_all['T.PGTO'].dropna().unique().tolist())
+                tipos_pagamento_disponiveis = ['TODOS'] + sorted(tipos_pagamento_todos)
             elif categoria_escolhida == 'POS':
                 tipos_pagamento_disponiveis = ['TODOS', 'DINHEIRO', 'DÉBITO', 'PIX', 'LISTA']
             elif categoria_escolhida == 'LISTA/PIX':
@@ -343,24 +763,19 @@ if meses_disponiveis:
                 tipos_pagamento_disponiveis = ['TODOS', 'DÉBITO', 'PIX', 'LISTA']
             else:
                 # Para categorias não mapeadas, filtrar pelos tipos disponíveis nessa categoria
-                df_categoria = df_all[df_all['EQUIPAMENTO'] == categoria_escolhida]
-                tipos_pagamento_disponiveis = ['TODOS'] + sorted(df_categoria['T.PGTO'].dropna().unique().tolist())
+                tipos_pagamento_disponiveis = ['TODOS'] + sorted(tipos_por_equipamento.get(categoria_escolhida, []))
             
             tipo_pag_escolhido = st.selectbox("Tipo de Pagamento", tipos_pagamento_disponiveis, key="filtro_tipo_pag")
         
         arquivo_selecionado = meses_arquivos[mes_selecionado]
         
         # Carregar dados do mês selecionado
-        if os.path.exists(os.path.join(PROCESSED_DIR, arquivo_selecionado)):
+        if os.path.exists(caminho_processado(arquivo_selecionado)):
             with st.spinner(f"Carregando dados de {mes_selecionado}..."):
                 df_mes = carregar_processado(arquivo_selecionado.replace('.parquet', ''))
                 if df_mes is not None:
                     # Aplicar filtros ao dataframe do mês
-                    df_mes_filtrado = df_mes.copy()
-                    if categoria_escolhida != 'TODOS':
-                        df_mes_filtrado = df_mes_filtrado[df_mes_filtrado['EQUIPAMENTO'] == categoria_escolhida]
-                    if tipo_pag_escolhido != 'TODOS':
-                        df_mes_filtrado = df_mes_filtrado[df_mes_filtrado['T.PGTO'] == tipo_pag_escolhido]
+                    df_mes_filtrado = aplicar_filtros(df_mes.copy(), categoria_escolhida, tipo_pag_escolhido)
                     
                     # --- CARDS DINÂMICOS BASEADOS NA CATEGORIA ---
                     st.subheader(f"Métricas de Vendas - {mes_selecionado}")
@@ -442,11 +857,7 @@ if meses_disponiveis:
                         st.metric("Total de Vendas", f"R$ {valor_total:,.2f}".replace(',', 'X').replace('.', ',').replace('X', '.'))
                     
                     # Aplicar filtros para todos os dados (para usar nos gráficos seguintes)
-                    df_filtros = df_all.copy()
-                    if categoria_escolhida != 'TODOS':
-                        df_filtros = df_filtros[df_filtros['EQUIPAMENTO'] == categoria_escolhida]
-                    if tipo_pag_escolhido != 'TODOS':
-                        df_filtros = df_filtros[df_filtros['T.PGTO'] == tipo_pag_escolhido]
+                    df_filtros = aplicar_filtros(df_totais_pdv, categoria_escolhida, tipo_pag_escolhido)
 
                     # --- GRÁFICO TOP 10 VENDAS POR PDV ---
                     st.subheader("Top 10 Vendas por PDV")
@@ -455,6 +866,7 @@ if meses_disponiveis:
                         agrupado = df_filtros.groupby('PDV')['VALOR'].sum().reset_index()
                         agrupado = agrupado.sort_values('VALOR', ascending=(ordem_top=="Menores"))
                         top10 = agrupado.head(10)
+                        tabelas_graficos['Vendas por PDV (todos os meses)'] = agrupado
                         fig_top = px.bar(
                             top10,
                             x='VALOR',
@@ -579,6 +991,7 @@ if meses_disponiveis:
                             if 'DATA/HORA' in df_pdv.columns:
                                 df_pdv['DATA'] = parse_dates_safely(df_pdv['DATA/HORA']).dt.date
                                 agrupado = df_pdv.groupby('DATA')['VALOR'].sum().reset_index()
+                                tabelas_graficos[f'Vendas diárias do PDV {pdv_escolhido}'] = agrupado
                                 fig_pdv = px.bar(
                                     agrupado,
                                     x='DATA',
@@ -593,6 +1006,7 @@ if meses_disponiveis:
                                 if 'SERIAL' in df_pdv.columns and 'DATA/HORA' in df_pdv.columns:
                                     df_pdv['DATA'] = parse_dates_safely(df_pdv['DATA/HORA']).dt.date
                                     agrupado_serial = df_pdv.groupby(['DATA', 'SERIAL'])['VALOR'].sum().reset_index()
+                                    tabelas_graficos[f'Vendas diárias por SERIAL do PDV {pdv_escolhido}'] = agrupado_serial
                                     fig_serial = px.line(
                                         agrupado_serial,
                                         x='DATA',
@@ -624,14 +1038,11 @@ if meses_disponiveis:
                             arquivo_anterior = meses_arquivos[mes_anterior]
                             
                             # Carregar dados do mês anterior
-                            if os.path.exists(os.path.join(PROCESSED_DIR, arquivo_anterior)):
+                            if os.path.exists(caminho_processado(arquivo_anterior)):
                                 df_mes_anterior = carregar_processado(arquivo_anterior.replace('.parquet', ''))
                                 
                                 # Aplicar os mesmos filtros ao mês anterior
-                                if categoria_escolhida != 'TODOS':
-                                    df_mes_anterior = df_mes_anterior[df_mes_anterior['EQUIPAMENTO'] == categoria_escolhida]
-                                if tipo_pag_escolhido != 'TODOS':
-                                    df_mes_anterior = df_mes_anterior[df_mes_anterior['T.PGTO'] == tipo_pag_escolhido]
+                                df_mes_anterior = aplicar_filtros(df_mes_anterior, categoria_escolhida, tipo_pag_escolhido)
                                 
                                 # Análise quinzenal do mês anterior
                                 df_quinz_anterior = df_mes_anterior.copy()
@@ -698,8 +1109,93 @@ if meses_disponiveis:
                         )
                         fig_quinz.update_layout(xaxis_title="Dia", yaxis_title="Valor de Vendas (R$)", height=400)
                         st.plotly_chart(fig_quinz, use_container_width=True)
+                        tabelas_graficos[f'Vendas diárias - {mes_selecionado}'] = agrupado[['DATA', 'VALOR']]
                     else:
                         st.info("Não há dados suficientes para análise quinzenal neste mês.")
+
+                    # --- EXPORTAÇÃO DOS DADOS FILTRADOS ---
+                    st.subheader("Exportar Dados")
+                    col_exp1, col_exp2 = st.columns(2)
+                    with col_exp1:
+                        escopo_exportacao = st.radio("Período", ["Mês selecionado", "Todos os meses"], horizontal=True, key="exportar_escopo")
+                    with col_exp2:
+                        formato_exportacao = st.radio("Formato", ["CSV", "Parquet"], horizontal=True, key="exportar_formato")
+
+                    if escopo_exportacao == "Mês selecionado":
+                        arquivos_exportacao = [arquivo_selecionado]
+                        periodo_exportacao = mes_selecionado
+                    else:
+                        arquivos_exportacao = [meses_arquivos[mes] for mes in meses_disponiveis]
+                        periodo_exportacao = "todos os meses"
+
+                    # Uma exportação pronta só vale para o período, filtros e formato com que foi gerada,
+                    # e enquanto os meses não mudarem (novo upload ou compactação)
+                    chave_exportacao = (tuple(arquivos_exportacao), assinatura_meses(arquivos_exportacao), categoria_escolhida, tipo_pag_escolhido, formato_exportacao)
+                    exportacao = st.session_state.get('exportacao')
+                    if exportacao is not None and exportacao['chave'] != chave_exportacao:
+                        descartar_exportacao(exportacao)
+                        del st.session_state['exportacao']
+
+                    # A exportação só é gerada sob demanda, para não pesar em cada rerun
+                    if st.button("Preparar exportação das transações", key="exportar_preparar"):
+                        limpar_exportacoes()
+                        if 'exportacao' in st.session_state:
+                            descartar_exportacao(st.session_state.pop('exportacao'))
+                        sem_detalhe = meses_sem_detalhe(arquivos_exportacao)
+                        if sem_detalhe:
+                            st.error(
+                                f"As transações de {', '.join(sem_detalhe)} não estão mais disponíveis: "
+                                "esses meses foram compactados sem guardar o detalhe (DASHBOARD_ARQUIVAR_DETALHE=0) "
+                                "e só têm o resumo diário. Escolha um período sem esses meses."
+                            )
+                        else:
+                            extensao = '.csv' if formato_exportacao == 'CSV' else '.parquet'
+                            caminho_exportacao = novo_caminho_exportacao(extensao)
+                            with st.spinner("Gerando exportação..."):
+                                try:
+                                    esquema = esquema_exportacao(arquivos_exportacao)
+                                    lotes = iterar_lotes_filtrados(arquivos_exportacao, categoria_escolhida, tipo_pag_escolhido, esquema)
+                                    total_linhas = escrever_exportacao(lotes, formato_exportacao, caminho_exportacao, esquema)
+                                    st.session_state['exportacao'] = {
+                                        'chave': chave_exportacao,
+                                        'caminho': caminho_exportacao,
+                                        'nome_arquivo': nome_exportacao('vendas', periodo_exportacao, categoria_escolhida, tipo_pag_escolhido) + extensao,
+                                        'total_linhas': total_linhas,
+                                    }
+                                except Exception as e:
+                                    descartar_exportacao({'caminho': caminho_exportacao})
+                                    st.error(f"Erro ao gerar exportação: {str(e)}")
+
+                    exportacao = st.session_state.get('exportacao')
+                    if exportacao is not None:
+                        if exportacao['total_linhas'] == 0:
+                            st.info("Nenhuma transação encontrada para os filtros selecionados.")
+                        elif not os.path.exists(exportacao['caminho']):
+                            # Expirada e apagada por limpar_exportacoes
+                            del st.session_state['exportacao']
+                            st.info("A exportação expirou. Prepare-a novamente.")
+                        else:
+                            st.download_button(
+                                f"Baixar {exportacao['nome_arquivo']} ({exportacao['total_linhas']:,} linhas)".replace(',', '.'),
+                                data=leitor_exportacao(exportacao['caminho']),
+                                file_name=exportacao['nome_arquivo'],
+                                mime='text/csv' if exportacao['nome_arquivo'].endswith('.csv') else 'application/octet-stream',
+                                # Sem rerun ao clicar, para o botão não ser recriado durante o download
+                                on_click="ignore",
+                                key="exportar_baixar"
+                            )
+
+                    # Tabelas agregadas de cada gráfico (pequenas, geradas em memória)
+                    if tabelas_graficos:
+                        with st.expander("Tabelas dos gráficos"):
+                            for titulo, tabela in tabelas_graficos.items():
+                                st.download_button(
+                                    f"Baixar: {titulo}",
+                                    data=df_para_csv_ptbr(tabela),
+                                    file_name=nome_exportacao(titulo) + '.csv',
+                                    mime='text/csv',
+                                    key=f"exportar_tabela_{titulo}"
+                                )
                 else:
                     st.error(f"Não foi possível carregar os dados para {mes_selecionado}.")
         else:
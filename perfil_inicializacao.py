@@ -0,0 +1,137 @@
+"""
+Perfil de inicialização do dashboard.
+
+Gera dois relatórios:
+  1. Tempo de import dos módulos carregados ao executar o app (python -X importtime)
+  2. Tempo até a primeira renderização com um armazenamento vazio e com 24 meses
+
+Uso:
+    python perfil_inicializacao.py [--linhas-por-mes 20000] [--repeticoes 3] [--top 15] [--app app.py]
+
+Com --app é possível medir outra versão do app (por exemplo, extraída com git show)
+e comparar as medianas com a versão atual.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), 'app.py'))
+
+MESES = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio', 'junho',
+         'julho', 'agosto', 'setembro', 'outubro', 'novembro', 'dezembro']
+
+# Executado em um processo novo. Mede separadamente o import do streamlit (pago uma
+# vez pelo servidor) e a execução do script até a primeira renderização (paga por
+# sessão); o total é a soma dos dois
+RODAR_APP = """
+import sys, time
+inicio = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+importado = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=300).run()
+fim = time.perf_counter()
+if at.exception:
+    raise SystemExit(str(at.exception[0].value))
+print(importado - inicio, fim - importado)
+"""
+
+def gerar_armazenamento(diretorio, quantidade_meses, linhas_por_mes):
+    """
+    Cria parquets processados sintéticos (mesmo formato gerado pelo upload)
+    """
+    import numpy as np
+    import pandas as pd
+
+    pasta = os.path.join(diretorio, 'processed')
+    os.makedirs(pasta, exist_ok=True)
+    rng = np.random.default_rng(0)
+    for i in range(quantidade_meses):
+        ano, mes = 23 + i // 12, i % 12
+        dias = rng.integers(1, 29, linhas_por_mes)
+        df = pd.DataFrame({
+            'DATA/HORA': [f"{d:02d}/{mes + 1:02d}/20{ano} 10:00:00" for d in dias],
+            'PDV': rng.choice([f"PDV {n:03d}" for n in range(200)], linhas_por_mes),
+            'SERIAL': rng.choice([f"SN{n:05d}" for n in range(600)], linhas_por_mes),
+            'EQUIPAMENTO': rng.choice(['POS', 'LISTA/PIX', 'TOTEM DE RECARGA'], linhas_por_mes),
+            'T.PGTO': rng.choice(['LISTA', 'PIX', 'DÉBITO', 'DINHEIRO'], linhas_por_mes),
+            'VALOR': rng.uniform(1, 200, linhas_por_mes).round(2),
+            'Mês': f"{MESES[mes].capitalize()} 20{ano}",
+        })
+        df.to_parquet(os.path.join(pasta, f"{MESES[mes]}_{ano}.parquet"))
+
+def relatorio_imports(app, diretorio, top):
+    """
+    Executa o app em modo "bare" com -X importtime e lista os pacotes mais caros
+    """
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', app],
+        cwd=diretorio, capture_output=True, text=True
+    )
+    # Com -X importtime o stderr traz o relatório; se o app falhar, o erro vem no final dele
+    if resultado.returncode != 0:
+        raise RuntimeError(f"O app terminou com código {resultado.returncode}:\n{resultado.stderr[-4000:]}")
+    pacotes = []
+    for linha in resultado.stderr.splitlines():
+        if not linha.startswith('import time:') or 'cumulative' in linha:
+            continue
+        # Formato: "import time: <próprio> | <cumulativo> | <pacote>", com o nome
+        # indentado conforme a profundidade do import
+        proprio, cumulativo, nome = linha[len('import time:'):].split('|')
+        # Apenas pacotes de primeiro nível
+        if not nome.startswith('  '):
+            pacotes.append((int(cumulativo), int(proprio), nome.strip()))
+    pacotes.sort(reverse=True)
+    print(f"\nImports mais caros (top {top}):")
+    print(f"{'cumulativo (ms)':>16} {'próprio (ms)':>13}  pacote")
+    for cumulativo, proprio, nome in pacotes[:top]:
+        print(f"{cumulativo / 1000:16.1f} {proprio / 1000:13.1f}  {nome}")
+
+def tempo_primeira_renderizacao(app, diretorio, repeticoes):
+    """
+    Retorna (import do streamlit, script) em segundos para cada execução. A primeira
+    execução é descartada: ela aquece o cache de disco e monta o manifesto, que o
+    armazenamento sintético não tem
+    """
+    tempos = []
+    for _ in range(repeticoes + 1):
+        resultado = subprocess.run(
+            [sys.executable, '-c', RODAR_APP, app],
+            cwd=diretorio, capture_output=True, text=True
+        )
+        if resultado.returncode != 0:
+            raise RuntimeError(resultado.stderr or resultado.stdout)
+        importacao, script = resultado.stdout.strip().splitlines()[-1].split()
+        tempos.append((float(importacao), float(script)))
+    return tempos[1:]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas-por-mes', type=int, default=20000)
+    parser.add_argument('--repeticoes', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--app', default=APP_PATH, help="app a medir (padrão: app.py deste diretório)")
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+
+    with tempfile.TemporaryDirectory() as vazio, tempfile.TemporaryDirectory() as cheio:
+        gerar_armazenamento(cheio, 24, args.linhas_por_mes)
+
+        print("== Armazenamento vazio ==")
+        relatorio_imports(app, vazio, args.top)
+        print("\n== 24 meses ==")
+        relatorio_imports(app, cheio, args.top)
+
+        print(f"\nTempo até a primeira renderização (s, mediana de {args.repeticoes} execuções):")
+        print(f"  {'':<10} {'total':>7} {'script':>7} {'streamlit':>10}")
+        for nome, diretorio in (("vazio", vazio), ("24 meses", cheio)):
+            tempos = tempo_primeira_renderizacao(app, diretorio, args.repeticoes)
+            importacao = statistics.median(t[0] for t in tempos)
+            script = statistics.median(t[1] for t in tempos)
+            total = statistics.median(sum(t) for t in tempos)
+            print(f"  {nome:<10} {total:7.2f} {script:7.2f} {importacao:10.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import importlib
+import os
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    Importa o app.py (o Streamlit roda em modo "bare", sem servidor) com os
+    diretórios de dados, que são relativos, apontando para tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(RAIZ)
+    modulo = importlib.import_module('app')
+    modulo.st.cache_data.clear()
+    return modulo
+
+
+@pytest.fixture
+def salvar_mes(app):
+    """
+    Grava um mês processado no formato gerado pelo upload e o registra no manifesto
+    """
+    import pandas as pd
+
+    def salvar(nome_base, linhas, **colunas_extras):
+        df = pd.DataFrame(linhas)
+        for coluna, valor in colunas_extras.items():
+            df[coluna] = valor
+        df['Mês'] = app.nome_base_para_mes(nome_base)
+        app.salvar_processado(df, nome_base)
+        return df
+
+    return salvar
+
+
+def transacoes(dia, mes, ano, quantidade=4, pdv='PDV 001'):
+    """
+    Gera transações de exemplo alternando equipamento e tipo de pagamento
+    """
+    tipos = ['LISTA', 'PIX', 'DÉBITO', 'DINHEIRO']
+    return [
+        {
+            'DATA/HORA': f"{dia + i % 2:02d}/{mes:02d}/20{ano} 1{i % 10}:00:00",
+            'PDV': pdv,
+            'SERIAL': f"SN{i % 2}",
+            'EQUIPAMENTO': 'POS' if i % 2 else 'LISTA/PIX',
+            'T.PGTO': tipos[i % len(tipos)],
+            'VALOR': 10.0 + i,
+        }
+        for i in range(quantidade)
+    ]
@@ -0,0 +1,122 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+from streamlit.testing.v1 import AppTest
+
+from conftest import RAIZ, transacoes
+
+
+def exportar(app, arquivos, formato, destino, categoria='TODOS', tipo_pag='TODOS'):
+    esquema = app.esquema_exportacao(arquivos)
+    lotes = app.iterar_lotes_filtrados(arquivos, categoria, tipo_pag, esquema, tamanho_lote=3)
+    return app.escrever_exportacao(lotes, formato, destino, esquema)
+
+
+def test_csv_alinha_colunas_de_meses_diferentes(app, salvar_mes, tmp_path):
+    salvar_mes('janeiro_25', transacoes(1, 1, 25), NSU=123)
+    # Mesmas colunas em outra ordem, sem NSU e com uma coluna a mais
+    fevereiro = pd.DataFrame(transacoes(1, 2, 25))[['VALOR', 'T.PGTO', 'PDV', 'SERIAL', 'EQUIPAMENTO', 'DATA/HORA']]
+    salvar_mes('fevereiro_25', fevereiro.to_dict('records'), OPERADOR='ANA')
+
+    destino = tmp_path / 'vendas.csv'
+    total = exportar(app, ['janeiro_25.parquet', 'fevereiro_25.parquet'], 'CSV', destino)
+
+    df = pd.read_csv(destino, sep=';', decimal=',', encoding='utf-8-sig')
+    assert total == len(df) == 8
+    assert list(df.columns[:7]) == ['DATA/HORA', 'PDV', 'SERIAL', 'EQUIPAMENTO', 'T.PGTO', 'VALOR', 'NSU']
+    assert set(df.columns) == {'DATA/HORA', 'PDV', 'SERIAL', 'EQUIPAMENTO', 'T.PGTO', 'VALOR', 'NSU', 'Mês', 'OPERADOR'}
+    assert df['VALOR'].sum() == 2 * sum(t['VALOR'] for t in transacoes(1, 1, 25))
+    assert df.loc[df['Mês'] == 'Janeiro 2025', 'NSU'].eq(123).all()
+    assert df.loc[df['Mês'] == 'Fevereiro 2025', 'NSU'].isna().all()
+    assert df.loc[df['Mês'] == 'Fevereiro 2025', 'OPERADOR'].eq('ANA').all()
+
+
+def test_parquet_unifica_tipos_divergentes(app, salvar_mes, tmp_path):
+    salvar_mes('janeiro_25', transacoes(1, 1, 25), NSU=123)
+    salvar_mes('fevereiro_25', transacoes(1, 2, 25), NSU='A-1')
+
+    destino = tmp_path / 'vendas.parquet'
+    total = exportar(app, ['janeiro_25.parquet', 'fevereiro_25.parquet'], 'Parquet', destino)
+
+    tabela = pq.read_table(destino)
+    assert total == tabela.num_rows == 8
+    assert str(tabela.schema.field('NSU').type) == 'string'
+    assert sorted(set(tabela.column('NSU').to_pylist())) == ['123', 'A-1']
+
+
+def test_filtros_aplicados_na_exportacao(app, salvar_mes, tmp_path):
+    salvar_mes('janeiro_25', transacoes(1, 1, 25, quantidade=8))
+
+    destino = tmp_path / 'pix.csv'
+    total = exportar(app, ['janeiro_25.parquet'], 'CSV', destino, categoria='POS', tipo_pag='PIX')
+
+    df = pd.read_csv(destino, sep=';', decimal=',', encoding='utf-8-sig')
+    assert total == len(df) == 2
+    assert df['T.PGTO'].eq('PIX').all() and df['EQUIPAMENTO'].eq('POS').all()
+
+
+def test_exportacoes_tem_caminho_exclusivo_e_expiram(app):
+    primeiro = app.novo_caminho_exportacao('.csv')
+    segundo = app.novo_caminho_exportacao('.csv')
+    assert primeiro != segundo
+    for caminho in (primeiro, segundo):
+        open(caminho, 'w').close()
+    antigo = app.time.time() - app.VALIDADE_EXPORTACAO - 1
+    app.os.utime(primeiro, (antigo, antigo))
+
+    app.limpar_exportacoes()
+
+    assert not app.os.path.exists(primeiro)
+    assert app.os.path.exists(segundo)
+    with app.leitor_exportacao(segundo)() as f:
+        assert f.read() == b''
+
+
+def test_mes_compactado_exporta_transacoes_arquivadas(app, salvar_mes, tmp_path):
+    janeiro = salvar_mes('janeiro_25', transacoes(1, 1, 25, quantidade=10), NSU=7)
+    fevereiro = salvar_mes('fevereiro_25', transacoes(1, 2, 25, quantidade=6), NSU=8)
+    app.compactar_mes('janeiro_25.parquet')
+    arquivos = ['janeiro_25.parquet', 'fevereiro_25.parquet']
+    esperado = pd.concat([janeiro, fevereiro], ignore_index=True)
+
+    destino_csv = tmp_path / 'vendas.csv'
+    total_csv = exportar(app, arquivos, 'CSV', destino_csv)
+    destino_parquet = tmp_path / 'vendas.parquet'
+    total_parquet = exportar(app, arquivos, 'Parquet', destino_parquet)
+
+    df_csv = pd.read_csv(destino_csv, sep=';', decimal=',', encoding='utf-8-sig')
+    df_parquet = pq.read_table(destino_parquet).to_pandas()
+    for total, df in ((total_csv, df_csv), (total_parquet, df_parquet)):
+        # As mesmas transações do upload, sem linhas do resumo diário
+        assert total == len(df) == len(esperado)
+        assert list(df.columns) == list(esperado.columns)
+        assert 'QTD' not in df.columns
+        assert list(df['DATA/HORA']) == list(esperado['DATA/HORA'])
+        assert df['VALOR'].sum() == esperado['VALOR'].sum()
+        assert df['NSU'].eq(esperado['NSU']).all()
+
+
+def test_mes_compactado_sem_detalhe_nao_e_exportado(app, salvar_mes, monkeypatch):
+    monkeypatch.setattr(app, 'ARQUIVAR_DETALHE', False)
+    salvar_mes('janeiro_25', transacoes(1, 1, 25))
+    salvar_mes('fevereiro_25', transacoes(1, 2, 25))
+    app.compactar_mes('janeiro_25.parquet')
+
+    assert app.meses_sem_detalhe(['janeiro_25.parquet', 'fevereiro_25.parquet']) == ['Janeiro 2025']
+    assert app.meses_sem_detalhe(['fevereiro_25.parquet']) == []
+
+
+def test_exportacao_pronta_descartada_quando_o_mes_muda(app, salvar_mes):
+    salvar_mes('janeiro_25', transacoes(1, 1, 25))
+    at = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=60).run()
+    at.button(key='exportar_preparar').click().run()
+    caminho = at.session_state['exportacao']['caminho']
+    assert os.path.exists(caminho)
+
+    # Novo upload do mesmo mês: a exportação pronta tem dados antigos
+    os.utime(app.caminho_processado('janeiro_25.parquet'), (0, 0))
+    at.run()
+
+    assert 'exportacao' not in at.session_state
+    assert not os.path.exists(caminho)
@@ -0,0 +1,61 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import transacoes
+
+
+def test_manifesto_guarda_totais_e_opcoes_de_filtro(app, salvar_mes):
+    df = salvar_mes('janeiro_25', transacoes(1, 1, 25, quantidade=8))
+
+    info = app.carregar_manifesto()['Janeiro 2025']
+
+    assert info['arquivo'] == 'janeiro_25.parquet'
+    assert info['nivel'] == 'detalhado'
+    assert info['totais'] == df.groupby('T.PGTO')['VALOR'].sum().to_dict()
+    assert info['tipos_por_equipamento'] == {'LISTA/PIX': ['DÉBITO', 'LISTA'], 'POS': ['DINHEIRO', 'PIX']}
+
+
+def test_totais_por_pdv_somam_todos_os_meses(app, salvar_mes):
+    janeiro = salvar_mes('janeiro_25', transacoes(1, 1, 25, pdv='PDV 001'))
+    fevereiro = salvar_mes('fevereiro_25', transacoes(1, 2, 25, pdv='PDV 002'))
+    app.compactar_mes('janeiro_25.parquet')
+
+    df = app.totais_por_pdv(app.assinatura_meses(['janeiro_25.parquet', 'fevereiro_25.parquet']))
+
+    por_pdv = df.groupby('PDV')['VALOR'].sum()
+    assert por_pdv['PDV 001'] == janeiro['VALOR'].sum()
+    assert por_pdv['PDV 002'] == fevereiro['VALOR'].sum()
+    assert set(df.columns) == {'PDV', 'EQUIPAMENTO', 'T.PGTO', 'VALOR'}
+
+
+def test_atualizacoes_simultaneas_nao_se_perdem(app):
+    meses = [f"{nome}_{ano}" for ano in range(20, 25) for nome in ('janeiro', 'fevereiro', 'marco', 'abril')]
+    resumo = {'totais': {'PIX': 1.0}, 'tipos_por_equipamento': {}}
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda nome_base: app.atualizar_manifesto(nome_base + '.parquet', 'detalhado', resumo), meses))
+
+    manifesto = app.carregar_manifesto()
+    assert sorted(manifesto) == sorted(app.nome_base_para_mes(nome_base) for nome_base in meses)
+    # Nenhum arquivo temporário fica para trás
+    assert os.listdir(app.PROCESSED_DIR) == ['manifest.json']
+
+
+def test_totais_por_pdv_reaproveitados_apos_reinicio(app, salvar_mes, monkeypatch):
+    salvar_mes('janeiro_25', transacoes(1, 1, 25, pdv='PDV 001'))
+    arquivos = ['janeiro_25.parquet']
+    esperado = app.totais_por_pdv(app.assinatura_meses(arquivos))
+
+    # Cache em memória vazio, como num processo novo: os meses não são lidos de novo
+    app.st.cache_data.clear()
+    with monkeypatch.context() as m:
+        m.setattr(app, 'colunas_existentes', lambda *args: pytest.fail('mês lido de novo'))
+        salvo = app.totais_por_pdv(app.assinatura_meses(arquivos))
+    assert salvo.equals(esperado)
+
+    # Um mês novo muda a assinatura e o resultado é recalculado
+    salvar_mes('fevereiro_25', transacoes(1, 2, 25, pdv='PDV 002'))
+    df = app.totais_por_pdv(app.assinatura_meses(arquivos + ['fevereiro_25.parquet']))
+    assert set(df['PDV']) == {'PDV 001', 'PDV 002'}
@@ -0,0 +1,88 @@
+import os
+
+import pandas as pd
+import pytest
+
+from conftest import transacoes
+
+MESES = ['janeiro', 'fevereiro', 'marco', 'abril', 'maio']
+
+
+@pytest.fixture
+def cinco_meses(salvar_mes):
+    return {
+        f"{nome}_25": salvar_mes(f"{nome}_25", transacoes(1, numero, 25, quantidade=6 + numero))
+        for numero, nome in enumerate(MESES, start=1)
+    }
+
+
+def test_resumo_preserva_totais(app, salvar_mes):
+    linhas = transacoes(1, 1, 25, quantidade=12) + transacoes(10, 1, 25, quantidade=5, pdv='PDV 002')
+    # Linha sem PDV não pode sumir do resumo
+    linhas.append({**linhas[0], 'PDV': None, 'VALOR': 99.5})
+    detalhe = salvar_mes('janeiro_25', linhas)
+
+    resumo = app.resumir_mes(detalhe)
+
+    assert resumo['VALOR'].sum() == pytest.approx(detalhe['VALOR'].sum())
+    assert resumo['QTD'].sum() == len(detalhe)
+    por_dia = app.parse_dates_safely(detalhe['DATA/HORA']).dt.strftime('%d/%m/%Y')
+    esperado = detalhe.groupby([por_dia, 'PDV', 'T.PGTO'], dropna=False)['VALOR'].sum()
+    obtido = resumo.groupby(['DATA/HORA', 'PDV', 'T.PGTO'], dropna=False)['VALOR'].sum()
+    pd.testing.assert_series_equal(obtido, esperado, check_names=False)
+
+
+def test_compacta_so_meses_fora_do_horizonte(app, cinco_meses, monkeypatch):
+    monkeypatch.setattr(app, 'MESES_DETALHE_COMPLETO', 2)
+
+    compactados = app.aplicar_retencao()
+
+    assert sorted(compactados, key=app.mes_ano_para_ordem) == ['Janeiro 2025', 'Fevereiro 2025', 'Marco 2025']
+    manifesto = app.carregar_manifesto()
+    for nome_base, detalhe in cinco_meses.items():
+        mes = app.nome_base_para_mes(nome_base)
+        arquivo = nome_base + '.parquet'
+        if mes in compactados:
+            assert manifesto[mes]['nivel'] == 'compactado'
+            assert not os.path.exists(os.path.join(app.PROCESSED_DIR, arquivo))
+            assert os.path.exists(os.path.join(app.ARCHIVE_DIR, arquivo))
+            resumo = pd.read_parquet(os.path.join(app.COMPACTED_DIR, arquivo))
+            assert resumo['VALOR'].sum() == pytest.approx(detalhe['VALOR'].sum())
+            assert resumo['QTD'].sum() == len(detalhe)
+        else:
+            assert manifesto[mes]['nivel'] == 'detalhado'
+            assert os.path.exists(os.path.join(app.PROCESSED_DIR, arquivo))
+        # Os totais do manifesto são os mesmos nos dois níveis
+        assert manifesto[mes]['totais'] == pytest.approx(detalhe.groupby('T.PGTO')['VALOR'].sum().to_dict())
+
+    # Rodar de novo não compacta mais nada
+    assert app.aplicar_retencao() == []
+
+
+def test_sem_arquivar_o_detalhe_e_descartado(app, cinco_meses, monkeypatch):
+    monkeypatch.setattr(app, 'MESES_DETALHE_COMPLETO', 4)
+    monkeypatch.setattr(app, 'ARQUIVAR_DETALHE', False)
+
+    assert app.aplicar_retencao() == ['Janeiro 2025']
+    assert not os.path.exists(os.path.join(app.PROCESSED_DIR, 'janeiro_25.parquet'))
+    assert not os.path.exists(app.ARCHIVE_DIR)
+    assert app.carregar_processado('janeiro_25')['QTD'].sum() == len(cinco_meses['janeiro_25'])
+
+
+def test_novo_upload_de_mes_compactado_substitui_o_resumo(app, cinco_meses, salvar_mes, monkeypatch):
+    monkeypatch.setattr(app, 'MESES_DETALHE_COMPLETO', 4)
+    app.aplicar_retencao()
+    assert app.carregar_manifesto()['Janeiro 2025']['nivel'] == 'compactado'
+
+    novo = salvar_mes('janeiro_25', transacoes(5, 1, 25, quantidade=3, pdv='PDV 009'))
+
+    assert not os.path.exists(os.path.join(app.COMPACTED_DIR, 'janeiro_25.parquet'))
+    assert app.carregar_manifesto()['Janeiro 2025']['nivel'] == 'detalhado'
+    pd.testing.assert_frame_equal(app.carregar_processado('janeiro_25'), novo)
+
+    # Ainda fora do horizonte: a retenção gera o resumo a partir dos dados novos
+    assert app.aplicar_retencao() == ['Janeiro 2025']
+    resumo = app.carregar_processado('janeiro_25')
+    assert set(resumo['PDV']) == {'PDV 009'}
+    assert resumo['VALOR'].sum() == pytest.approx(novo['VALOR'].sum())
+    assert app.carregar_manifesto()['Janeiro 2025']['totais'] == pytest.approx(novo.groupby('T.PGTO')['VALOR'].sum().to_dict())
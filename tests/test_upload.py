@@ -0,0 +1,20 @@
+import os
+
+from streamlit.testing.v1 import AppTest
+
+from conftest import RAIZ
+
+
+def test_upload_processado_uma_unica_vez(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    at = AppTest.from_file(os.path.join(RAIZ, 'app.py'), default_timeout=60).run()
+    csv = "DATA/HORA;PDV;SERIAL;EQUIPAMENTO;T.PGTO;VALOR\n01/01/2025 10:00:00;PDV 001;SN1;POS;PIX;10,00\n"
+    at.file_uploader[0].set_value(('janeiro_25.csv', csv.encode('utf-8'), 'text/csv')).run()
+    caminho_csv = tmp_path / 'uploads' / 'janeiro_25.csv'
+    assert caminho_csv.exists()
+
+    # O arquivo continua no file_uploader, mas os reruns seguintes não o processam de novo
+    caminho_csv.unlink()
+    at.run()
+    assert at.file_uploader[0].value is not None
+    assert not caminho_csv.exists()